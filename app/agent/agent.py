@@ -1,7 +1,72 @@
+import asyncio
+import functools
+
 from google.adk.agents import LlmAgent
 from google.adk.tools import agent_tool
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.tool_context import ToolContext
+from google.genai import types
+
 from .prompts import FACILITATOR_INSTRUCTIONS
 
+# すべてのファシリテーターAgentが共有する名前（ADKのapp_nameとしても使われる）
+FACILITATOR_APP_NAME = "Facilitator"
+
+# モデルのティア定義（単純なターンは軽量モデルへルーティングしてコストを下げる）
+MODEL_TIERS = {
+    "cheap": "gemini-2.5-flash-lite",
+    "std": "gemini-2.5-flash",
+}
+
+# これらの語を含むクエリは本格的なファシリテーションが必要とみなす
+_STD_TIER_KEYWORDS = (
+    "アイデア", "批評", "ブレスト", "会議", "施策", "検討",
+    "idea", "critique", "brainstorm",
+)
+
+def select_model(query: str) -> str:
+    """
+    クエリの内容から利用するモデルのティア（MODEL_TIERSのキー）を選択します。
+    挨拶や相づち程度の短いターンは軽量モデルで十分なため、
+    長さとキーワードの簡単なヒューリスティックで振り分けます。
+    """
+    stripped = query.strip()
+    if len(stripped) <= 20 and not any(k in stripped.lower() for k in _STD_TIER_KEYWORDS):
+        return "cheap"
+    return "std"
+
+
+class ParallelAgentTool(BaseTool):
+    """複数のAgentToolを1回のツール呼び出しで並列実行する複合ツール"""
+
+    def __init__(self, name: str, description: str, agents: list[LlmAgent]):
+        super().__init__(name=name, description=description)
+        self._tools = [agent_tool.AgentTool(agent=a) for a in agents]
+
+    def _get_declaration(self) -> types.FunctionDeclaration:
+        return types.FunctionDeclaration(
+            name=self.name,
+            description=self.description,
+            parameters=types.Schema(
+                type=types.Type.OBJECT,
+                properties={
+                    "request": types.Schema(
+                        type=types.Type.STRING,
+                        description="各Agentに渡すトピックや依頼内容",
+                    ),
+                },
+                required=["request"],
+            ),
+        )
+
+    async def run_async(self, *, args: dict, tool_context: ToolContext) -> dict:
+        # 逐次呼び出しだとLLMの往復が直列に積み上がるため、gatherで同時実行する
+        results = await asyncio.gather(
+            *(tool.run_async(args=args, tool_context=tool_context) for tool in self._tools)
+        )
+        return {tool.name: result for tool, result in zip(self._tools, results)}
+
+
 # Agent as a tool で利用されるエージェント
 idea_agent = LlmAgent(
     name="IdeaAgent", 
@@ -17,23 +82,45 @@ critic_agent = LlmAgent(
     instruction="アイデアに対して建設的な批評を行い改善点を簡潔に提示します。",
 )
 
-# 利用可能なツール
+# アイデア出しと批評を1ターンで同時に実行する複合ツール
+brainstorm_and_critique = ParallelAgentTool(
+    name="brainstorm_and_critique",
+    description="IdeaAgentとCriticAgentを並列に呼び出し、アイデア出しと批評を同時に行います。",
+    agents=[idea_agent, critic_agent],
+)
+
+# 利用可能なツール（値はLlmAgentまたはツールそのもの）
 available_tools = {
     "IdeaAgent": idea_agent,
     "CriticAgent": critic_agent,
+    "brainstorm_and_critique": brainstorm_and_critique,
 }
 
-tools_default = []
-available_tools_prompt_default = ""
-for name, tool in available_tools.items():
-    tools_default.append(agent_tool.AgentTool(agent=tool))
-    available_tools_prompt_default += f"- {name}: {tool.description}\n"
+def _as_tool(tool) -> BaseTool:
+    """available_toolsのエントリをADKのツールに変換します（Agentの場合はAgentToolでラップ）。"""
+    if isinstance(tool, BaseTool):
+        return tool
+    return agent_tool.AgentTool(agent=tool)
+
+# プロンプト生成で属性アクセスを繰り返さないよう、説明文をモジュールロード時に引いておく
+_TOOL_DESCRIPTIONS = {name: tool.description for name, tool in available_tools.items()}
+
+@functools.lru_cache(maxsize=64)
+def _instructions_for(tool_key: tuple[str, ...]) -> str:
+    """ツール構成ごとに整形済みのファシリテーター指示文を返します（キャッシュ付き）。"""
+    bullets = "\n".join(
+        f"- {name}: {_TOOL_DESCRIPTIONS[name]}"
+        for name in tool_key if name in available_tools
+    )
+    return FACILITATOR_INSTRUCTIONS.format(available_tools_prompt=bullets)
+
+tools_default = [_as_tool(tool) for tool in available_tools.values()]
 
 # デフォルトのファシリ Agent
 facilitator_agent_default = LlmAgent(
-    name="Facilitator",
+    name=FACILITATOR_APP_NAME,
     model="gemini-2.5-flash",
-    instruction=FACILITATOR_INSTRUCTIONS.format(available_tools_prompt=available_tools_prompt_default.strip()),
+    instruction=_instructions_for(tuple(available_tools)),
     tools=tools_default
     # Alternatively, could use LLM Transfer if research_assistant is a sub_agent
 )
@@ -41,22 +128,27 @@ facilitator_agent_default = LlmAgent(
 root_agent = facilitator_agent_default
 
 # ファクトリ関数
-def create_facilitator_agent(selected_tool_names: list[str]) -> LlmAgent:
+@functools.lru_cache(maxsize=64)
+def create_facilitator_agent(selected_tool_names: tuple[str, ...], model_hint: str = "std") -> LlmAgent:
     """
-    選択されたツールのリストに基づいて、ファシリテーターエージェントを動的に生成します。
+    選択されたツールのタプルに基づいて、ファシリテーターエージェントを動的に生成します。
+    同一のツール構成・ティアに対してはキャッシュ済みのLlmAgentを返すため、
+    呼び出し側は tuple(sorted(...)) でキーを正規化して渡してください。
+
+    Args:
+        selected_tool_names: 利用するツール名のタプル（ソート済み）
+        model_hint: MODEL_TIERSのキー（select_modelの結果）
     """
-    selected_tools = []
-    available_tools_prompt = ""
-    for name in selected_tool_names:
-        if name in available_tools:
-            selected_tools.append(agent_tool.AgentTool(agent=available_tools[name]))
-            available_tools_prompt += f"- {name}: {available_tools[name].description}\n"
-            
+    selected_tools = [
+        _as_tool(available_tools[name])
+        for name in selected_tool_names if name in available_tools
+    ]
+
     facilitator_agent = LlmAgent(
-        name="Facilitator",
-        model="gemini-2.5-flash",
+        name=FACILITATOR_APP_NAME,
+        model=MODEL_TIERS.get(model_hint, MODEL_TIERS["std"]),
         description="会議の議論をリードするファシリテータAgentです。",
-        instruction=FACILITATOR_INSTRUCTIONS.format(available_tools_prompt=available_tools_prompt.strip()),
+        instruction=_instructions_for(selected_tool_names),
         tools=selected_tools
     )
     return facilitator_agent
\ No newline at end of file
@@ -3,6 +3,8 @@ FACILITATOR_INSTRUCTIONS = """
 Available Toolsに記載されているAgentが参加者のリストで、あなたは発言を求めることができます。
 議論が尽くされ、アイデアについて以下の要素が完全に網羅される段階に至ることがゴールです。
 ユーザーから具体的な会議のテーマが与えられてない場合は、会議のテーマをユーザーに聞き返しましょう。
+同じターンでアイデア出しと批評の両方を求めたい場合、brainstorm_and_critique が利用可能であれば
+IdeaAgentとCriticAgentを個別に呼ぶのではなく、brainstorm_and_critique を1回呼び出してください（並列実行されるため高速です）。
 
 # 必要な要素
 **概要：** [施策の概要]
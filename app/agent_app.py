@@ -1,29 +1,61 @@
 import asyncio
-import json, os, pprint, time, uuid
+import json, logging, os, pprint, time, uuid
 
+from google import genai
 from google.genai import types
 from google.adk.artifacts import InMemoryArtifactService
 from google.adk.memory.in_memory_memory_service import InMemoryMemoryService
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
 
+# プロセス全体で同時に実行できるモデル呼び出し数と、
+# 空きを待てるリクエスト数の上限（超過分は即座に拒否する）
+MODEL_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "16"))
+MAX_WAITERS = int(os.getenv("GEMINI_MAX_WAITERS", "32"))
+
+MODEL_SEM = asyncio.Semaphore(MODEL_CONCURRENCY)
+_waiters = 0
+
+logger = logging.getLogger(__name__)
+
+# プリウォーム専用のgenaiクライアント（初回利用時に一度だけ生成）
+_prewarm_client = None
+
+def _get_prewarm_client() -> genai.Client:
+    global _prewarm_client
+    if _prewarm_client is None:
+        _prewarm_client = genai.Client(
+            vertexai=True,
+            project=os.getenv("GOOGLE_CLOUD_PROJECT"),
+            location=os.getenv("GOOGLE_CLOUD_LOCATION"),
+        )
+    return _prewarm_client
+
+
+class AgentBusyError(Exception):
+    """モデル呼び出しの待ち行列が上限を超えている場合に送出される例外"""
+
+
 class LocalApp:
     """Agentで推論を実行するためのクラス"""
 
-    def __init__(self, agent):
+    def __init__(self, agent, session_service=None, artifact_service=None, memory_service=None):
         """
         LocalAppを初期化します。
 
         Args:
             agent: 実行するエージェント
+            session_service: セッションの保存先（省略時はインメモリ）
+            artifact_service: アーティファクトの保存先（省略時はインメモリ）
+            memory_service: メモリの保存先（省略時はインメモリ）
         """
         self.agent = agent
         self._runner = Runner(
             app_name=self.agent.name,
             agent=self.agent,
-            artifact_service=InMemoryArtifactService(),
-            session_service=InMemorySessionService(),
-            memory_service=InMemoryMemoryService(),
+            artifact_service=artifact_service or InMemoryArtifactService(),
+            session_service=session_service or InMemorySessionService(),
+            memory_service=memory_service or InMemoryMemoryService(),
         )
 
     async def create_session(self, user_id: str) -> str:
@@ -35,9 +67,35 @@ class LocalApp:
         )
         return session.id
 
-    async def stream(self, query: str, session_id: str, user_id: str):
+    async def prewarm(self) -> None:
+        """
+        ファシリテーターの静的な指示プレフィックスで最小限の生成を1回実行し、
+        モデル側の接続とプレフィックスキャッシュを事前に温めます。
+        初回ターンのprefill分のレイテンシを先払いするための処理で、
+        失敗しても実害はないため例外はログに残すだけで握りつぶします。
+        """
+        try:
+            client = _get_prewarm_client()
+            await client.aio.models.generate_content(
+                model=self.agent.model,
+                contents="ok",
+                config=types.GenerateContentConfig(
+                    system_instruction=self.agent.instruction,
+                    max_output_tokens=1,
+                ),
+            )
+            logger.debug("プリウォーム完了 (agent: %s)", self.agent.name)
+        except Exception as e:
+            logger.debug("プリウォームに失敗しました: %s", e)
+
+    def stream(self, query: str, session_id: str, user_id: str):
         """
         クエリに対するエージェントの応答をストリーミングします。
+        同時実行数はプロセス共通のセマフォで制限され、
+        待ち行列が上限を超えている場合はAgentBusyErrorを送出します。
+
+        同期メソッドなので、返り値をawaitせずそのままasync forで反復してください
+        （余分なコルーチンのスケジュールを1回分省けます）。
 
         Args:
             query: ユーザーのクエリ
@@ -46,16 +104,41 @@ class LocalApp:
 
         Returns:
             イベントの非同期ジェネレータ
+
+        Raises:
+            AgentBusyError: モデル呼び出しの待ち行列が上限を超えている場合
         """
-        content = types.Content(role="user", parts=[types.Part.from_text(text=query)])
-        async_events = self._runner.run_async(
-            user_id=user_id,
-            session_id=session_id,
-            new_message=content,
+        if _waiters >= MAX_WAITERS:
+            raise AgentBusyError(
+                f"モデル呼び出しが混雑しています（待ち: {_waiters}/{MAX_WAITERS}）"
+            )
+
+        # フィールドは固定でroleとtextのみのため、model_constructで
+        # Pydanticのフィールド検証を省略する（クエリごとのホットパス）
+        content = types.Content.model_construct(
+            role="user", parts=[types.Part.model_construct(text=query)]
         )
 
-        return async_events
-    
+        async def _bounded_events():
+            global _waiters
+            _waiters += 1
+            try:
+                await MODEL_SEM.acquire()
+            finally:
+                _waiters -= 1
+            # ストリーム完了（またはクライアント切断によるclose）までセマフォを保持する
+            try:
+                async for event in self._runner.run_async(
+                    user_id=user_id,
+                    session_id=session_id,
+                    new_message=content,
+                ):
+                    yield event
+            finally:
+                MODEL_SEM.release()
+
+        return _bounded_events()
+
         #async_events は <class 'async_generator'> 
         # result = []
         # async for event in async_events:
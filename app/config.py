@@ -6,5 +6,6 @@ class Config:
     GOOGLE_CLOUD_LOCATION = os.getenv('GOOGLE_CLOUD_LOCATION')
     GOOGLE_GENAI_USE_VERTEXAI=os.getenv('GOOGLE_GENAI_USE_VERTEXAI')
     GOOGLE_CLOUD_BUCKET = os.getenv('GOOGLE_CLOUD_BUCKET')
+    REDIS_URL = os.getenv('REDIS_URL')
 
 APP_CONFIG = Config()
\ No newline at end of file
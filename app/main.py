@@ -1,24 +1,34 @@
 # main.py
 import os
+import io
+import json
 import uuid
+import hashlib
 import asyncio
 import logging
 import time
 import pprint
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, APIRouter, HTTPException, Request
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 from pydantic import BaseModel
+from cachetools import LRUCache, TTLCache
 
 import vertexai
+import redis.asyncio as aioredis
+
+from google.adk.artifacts import InMemoryArtifactService
+from google.adk.memory.in_memory_memory_service import InMemoryMemoryService
+from google.adk.sessions import InMemorySessionService
 
 from config import APP_CONFIG
-from agent_app import LocalApp
-from agent.agent import available_tools, create_facilitator_agent
+from agent_app import LocalApp, AgentBusyError
+from redis_session_service import RedisSessionService
+from agent.agent import FACILITATOR_APP_NAME, available_tools, create_facilitator_agent, select_model
 
 # --- ロギング設定 ---
 logging.basicConfig(
@@ -30,6 +40,49 @@ logger = logging.getLogger(__name__)
 # app 全体の状態管理用の dict
 app_state = {}
 
+# fire-and-forgetタスクへの強参照
+# （イベントループはタスクを弱参照でしか保持しないため、
+#   参照を持たないと実行途中でGCに回収されることがある）
+_background_tasks: set[asyncio.Task] = set()
+
+def _spawn_background_task(coro) -> asyncio.Task:
+    """バックグラウンドタスクを起動し、完了まで強参照を保持します。"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+class _SessionKeyCache(TTLCache):
+    """
+    破棄されたエントリをevictedリストに積んで後から回収できるようにしたTTLCache。
+
+    cachetoolsのTTLCacheは__setitem__やpopitemの内部でもexpire()を呼び、
+    期限切れエントリをその場で破棄してしまうため、スイーパーが定期的に
+    expire()をポーリングするだけでは消えたペアを受け取れない。
+    expire()とpopitem()（容量あふれ時の追い出し）を通過したペアをすべて
+    記録しておき、スイーパーがdrain_evicted()でまとめて引き取る。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._evicted: list[tuple[str, tuple[str, str]]] = []
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        self._evicted.extend(expired)
+        return expired
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._evicted.append((key, value))
+        return key, value
+
+    def drain_evicted(self) -> list[tuple[str, tuple[str, str]]]:
+        """これまでに破棄された(session_id, (cache_key, user_id))のペアを取り出します。"""
+        evicted, self._evicted = self._evicted, []
+        return evicted
+
 # --- FastAPIのライフサイクル管理 ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -52,20 +105,50 @@ async def lifespan(app: FastAPI):
                 "GOOGLE_CLOUD_STORAGE_BUCKET"
             )
 
-        # 2. Vertex AI SDKの初期化
-        # これはブロッキング処理のため、非同期のイベントループをブロックしないように
-        # asyncio.to_threadを使って別スレッドで実行します。
-        logger.info(f"Vertex AI SDKを初期化中 (Project: {project_id}, Location: {location})...")
-        await asyncio.to_thread(
-            vertexai.init,
-            project=project_id,
-            location=location,
-            staging_bucket=f"gs://{bucket}"
-        )
-
-        # 3. アクティブなセッションとエージェントインスタンスを保持する辞書を初期化
-        app_state["local_app_cache"] = {} # ツール構成が同じ場合はAgentのインスタンスをキャッシュする
-        app_state["session_to_cache_key"] = {} # session_idからツール構成のキーを引くためのマッピング
+        # 2. Vertex AI SDKの初期化は起動時には行わない
+        # 起動をブロックするとCloud Runのコールドスタートでreadinessが遅れるため、
+        # 最初のリクエスト時に_ensure_vertex()で遅延初期化する
+
+        # 3. プロセス内で共有するADKサービス群を構築
+        # Runner（とLocalApp）はツール構成ごとに作られるが、セッション・アーティファクト・
+        # メモリの各サービスは1組だけ生成してすべてのLocalAppで共有する。
+        # REDIS_URLが設定されている場合はセッションをRedisに保持し、
+        # Cloud Runの複数インスタンス間でも共有できるようにする
+        if APP_CONFIG.REDIS_URL:
+            redis_client = aioredis.from_url(APP_CONFIG.REDIS_URL, decode_responses=True)
+            app_state["redis"] = redis_client
+            session_service = RedisSessionService(redis_client)
+            logger.info("Redisセッションストアを使用します")
+        else:
+            app_state["redis"] = None
+            session_service = InMemorySessionService()
+        app_state["shared_services"] = {
+            "session_service": session_service,
+            "artifact_service": InMemoryArtifactService(),
+            "memory_service": InMemoryMemoryService(),
+        }
+
+        # 4. アクティブなセッションとエージェントインスタンスを保持するキャッシュを初期化
+        # 無制限のdictだとツール構成・セッションが増えるほどRSSが増え続けるため、
+        # 上限付きのLRU/TTLキャッシュで抑える（セッションは共有サービス側にあるため、
+        # LRUから溢れたLocalAppは安全に破棄・再構築できる）
+        app_state["local_app_cache"] = LRUCache(maxsize=32) # ツール構成が同じ場合はAgentのインスタンスをキャッシュする
+        app_state["session_to_cache_key"] = _SessionKeyCache(maxsize=10_000, ttl=3600) # session_idから(ツール構成キー, user_id)を引くためのマッピング
+
+        # バックグラウンド実行中クエリの結果キュー（task_id -> asyncio.Queue）
+        app_state["query_tasks"] = TTLCache(maxsize=1_000, ttl=3600)
+
+        # 同一クエリの応答キャッシュ（Redis無効時のプロセス内フォールバック）
+        app_state["response_cache"] = TTLCache(maxsize=1_000, ttl=3600)
+
+        # 5. トップページのHTMLを一度だけ読み込んでキャッシュ
+        # （リクエストごとのstat/openを省き、ETagでブラウザキャッシュも効かせる）
+        with open('static/index.html', 'rb') as f:
+            app_state["index_html"] = f.read()
+        app_state["index_etag"] = f'"{hashlib.blake2b(app_state["index_html"], digest_size=16).hexdigest()}"'
+
+        # 期限切れセッションを定期的に掃除するバックグラウンドタスクを起動
+        app_state["session_sweeper"] = asyncio.create_task(_sweep_expired_sessions())
         logger.info("共有セッションストアを初期化しました。アプリケーションがリクエストを受け付けます。")
 
     except Exception as e:
@@ -76,11 +159,94 @@ async def lifespan(app: FastAPI):
 
     # `yield`でFastAPIアプリケーション本体の処理に制御を移す
     yield
-    
+
     # --- アプリケーション終了時の処理 ---
-    # 今回は特にクリーンアップ処理は不要
+    app_state["session_sweeper"].cancel()
+    if app_state.get("redis") is not None:
+        await app_state["redis"].aclose()
     logger.info("アプリケーションをシャットダウンします。")
 
+
+# Vertex AI SDKの遅延初期化用の状態（ダブルチェックロッキング）
+_vertex_initialized = False
+_vertex_init_lock = asyncio.Lock()
+
+
+async def _ensure_vertex() -> None:
+    """
+    Vertex AI SDKを最初のリクエスト時に一度だけ初期化します。
+    起動時ではなくここで初期化することで、ヘルスチェックは即座に応答できます。
+    """
+    global _vertex_initialized
+    if _vertex_initialized:
+        return
+    async with _vertex_init_lock:
+        if _vertex_initialized:
+            return
+        project_id = APP_CONFIG.GOOGLE_CLOUD_PROJECT
+        location = APP_CONFIG.GOOGLE_CLOUD_LOCATION
+        bucket = APP_CONFIG.GOOGLE_CLOUD_BUCKET
+        logger.info(f"Vertex AI SDKを初期化中 (Project: {project_id}, Location: {location})...")
+        # ブロッキング処理のため、イベントループを塞がないよう別スレッドで実行する
+        await asyncio.to_thread(
+            vertexai.init,
+            project=project_id,
+            location=location,
+            staging_bucket=f"gs://{bucket}"
+        )
+        _vertex_initialized = True
+
+
+async def _store_session_entry(session_id: str, cache_key: str, user_id: str) -> None:
+    """session_idから(ツール構成キー, user_id)を引くためのマッピングを保存します。"""
+    redis = app_state.get("redis")
+    if redis is not None:
+        # Redis有効時はマッピングもRedisに置き、インスタンス間で共有する
+        await redis.setex(f"session_key:{session_id}", 3600, f"{cache_key}|{user_id}")
+    else:
+        app_state["session_to_cache_key"][session_id] = (cache_key, user_id)
+
+
+async def _get_session_entry(session_id: str) -> tuple[str, str] | None:
+    """session_idに対応する(ツール構成キー, user_id)を取得します。"""
+    redis = app_state.get("redis")
+    if redis is not None:
+        raw = await redis.get(f"session_key:{session_id}")
+        if raw is None:
+            return None
+        cache_key, _, user_id = raw.partition("|")
+        return (cache_key, user_id)
+    return app_state["session_to_cache_key"].get(session_id)
+
+
+async def _sweep_expired_sessions(interval_seconds: int = 300):
+    """
+    session_to_cache_keyから破棄されたエントリを定期的に回収し、
+    対応するADKセッションを削除するバックグラウンドタスク。
+    """
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            cache = app_state["session_to_cache_key"]
+            # 書き込みが途絶えている間のTTL切れもここで確実に破棄リストへ送る
+            cache.expire()
+            evicted = cache.drain_evicted()
+            # LocalAppはLRUから追い出されている可能性があるため、
+            # セッションは共有サービスから直接削除する
+            session_service = app_state["shared_services"]["session_service"]
+            for session_id, (_, user_id) in evicted:
+                await session_service.delete_session(
+                    app_name=FACILITATOR_APP_NAME,
+                    user_id=user_id,
+                    session_id=session_id,
+                )
+            if evicted:
+                logger.info(f"期限切れセッションを{len(evicted)}件削除しました")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"セッション掃除処理でエラーが発生しました: {e}")
+
 # --- FastAPIアプリケーションのインスタンス化 ---
 app = FastAPI(
     title="Agent App",
@@ -116,9 +282,8 @@ class QueryRequest(BaseModel):
     query: str
     session_id: str
 
-class QueryResponse(BaseModel):
-    response: str
-    session_id: str
+class SubmitQueryResponse(BaseModel):
+    task_id: str
 
 class HealthResponse(BaseModel):
     status: str
@@ -136,14 +301,18 @@ def health_check():
     """
     return {"status": "ok"}
 
-@app.get("/tools", response_model=ToolsListResponse, tags=["Agent"])
-def list_tools():
-    """UIが選択肢を表示するために、利用可能なツールの一覧を返します。"""
-    tool_list = [
+# available_toolsはインポート後に変化しないため、レスポンスは一度だけ直列化しておく
+_TOOLS_JSON = ToolsListResponse(
+    tools=[
         ToolInfo(name=name, description=tool.description)
         for name, tool in available_tools.items()
     ]
-    return ToolsListResponse(tools=tool_list)
+).model_dump_json()
+
+@app.get("/tools", response_model=ToolsListResponse, tags=["Agent"])
+def list_tools():
+    """UIが選択肢を表示するために、利用可能なツールの一覧を返します。"""
+    return Response(_TOOLS_JSON, media_type="application/json")
 
 
 @app.post("/sessions/create", response_model=CreateSessionResponse, tags=["Agent"])
@@ -152,6 +321,7 @@ async def create_session(request: CreateSessionRequest):
     選択されたツールでエージェントを初期化（またはキャッシュから取得）し、新しいセッションを開始します。
     """
     logger.info(f"新規セッション作成リクエスト (user: {request.user_id}, tools: {request.tool_names})")
+    await _ensure_vertex()
     try:
         # ツールリストから一意なキャッシュキーを生成（順序を固定するためソート）
         cache_key = ",".join(sorted(request.tool_names))
@@ -162,18 +332,20 @@ async def create_session(request: CreateSessionRequest):
         if not local_app:
             logger.info(f"キャッシュにインスタンスがないため新規作成します (key: {cache_key})")
     
-            agent = create_facilitator_agent(request.tool_names)
-            local_app = LocalApp(agent=agent)
+            agent = create_facilitator_agent(tuple(sorted(request.tool_names)))
+            local_app = LocalApp(agent=agent, **app_state["shared_services"])
             # 作成したインスタンスをキャッシュに保存
             app_state["local_app_cache"][cache_key] = local_app
+            # 指示プレフィックスでモデルを事前に温めておく（fire-and-forget）
+            _spawn_background_task(local_app.prewarm())
         else:
             logger.info(f"キャッシュからインスタンスを再利用します (key: {cache_key})")
 
         # 取得または作成したLocalAppインスタンスでADKセッションを作成
         session_id = await local_app.create_session(user_id=request.user_id)
         
-        # 新しいsession_idとキャッシュキーを紐づけて保存
-        app_state["session_to_cache_key"][session_id] = cache_key
+        # 新しいsession_idとキャッシュキー・user_idを紐づけて保存
+        await _store_session_entry(session_id, cache_key, request.user_id)
         
         logger.info(f"新規セッション作成完了: {session_id}")
         return CreateSessionResponse(session_id=session_id)
@@ -183,78 +355,246 @@ async def create_session(request: CreateSessionRequest):
         raise HTTPException(status_code=500, detail="セッションの作成に失敗しました。")
 
 
-@app.post("/query", response_model=QueryResponse, tags=["Agent"])
-async def query_agent(request: QueryRequest):
+def _response_cache_key(cache_key: str, query: str) -> str:
+    """ツール構成キーと正規化済みクエリから応答キャッシュのキーを生成します。"""
+    normalized = " ".join(query.split()).lower()
+    return hashlib.blake2b(f"{cache_key}|{normalized}".encode(), digest_size=16).hexdigest()
+
+
+async def _get_cached_response(key: str) -> str | None:
+    """応答キャッシュを参照します（Redis有効時はRedis、無効時はプロセス内キャッシュ）。"""
+    redis = app_state.get("redis")
+    if redis is not None:
+        return await redis.get(f"response_cache:{key}")
+    return app_state["response_cache"].get(key)
+
+
+async def _store_cached_response(key: str, text: str) -> None:
+    """完成した応答をTTL付きでキャッシュに保存します。"""
+    redis = app_state.get("redis")
+    if redis is not None:
+        await redis.setex(f"response_cache:{key}", 3600, text)
+    else:
+        app_state["response_cache"][key] = text
+
+
+async def _local_app_for_session(session_id: str, model_hint: str = "std") -> tuple[LocalApp, str]:
     """
-    Agent Engineに問い合わせを行い、応答を取得します。
+    session_idに対応するLocalAppインスタンスとツール構成キーを取得するヘルパー関数。
+    model_hintが"std"以外の場合は、同じツール構成でモデルティアだけ異なる
+    LocalAppを別キーでキャッシュして使い分けます（セッションは共有サービス側にあるため
+    ティアをまたいでも会話は継続できます）。
     """
-    # session_idから、どのツール構成（キャッシュキー）が使われたかを取得
-    cache_key = app_state["session_to_cache_key"].get(request.session_id)
-    if not cache_key:
-        raise HTTPException(status_code=404, detail=f"セッション設定が見つかりません: {request.session_id}")
+    entry = await _get_session_entry(session_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail=f"セッション設定が見つかりません: {session_id}")
+    cache_key, _ = entry
 
-    # Agent の初期化
-    local_app = app_state["local_app_cache"].get(cache_key)
+    app_cache_key = cache_key if model_hint == "std" else f"{cache_key}#{model_hint}"
+    local_app = app_state["local_app_cache"].get(app_cache_key)
     if not local_app:
-        raise HTTPException(status_code=500, detail=f"内部エラー: セッションに対応するエージェントが見つかりません")
-    
-    current_session_id = request.session_id
-    user_id = request.user_id
-    logger.info(f"クエリ受信 (session_id: {request.session_id}, cache_key: {cache_key})")
+        # セッションは共有サービス側に保持されているため、LRUから追い出された場合や
+        # 別インスタンスで作成されたセッションでもcache_keyからLocalAppを再構築できる
+        agent = create_facilitator_agent(tuple(sorted(cache_key.split(","))), model_hint)
+        local_app = LocalApp(agent=agent, **app_state["shared_services"])
+        app_state["local_app_cache"][app_cache_key] = local_app
+
+    logger.info(f"クエリ受信 (session_id: {session_id}, cache_key: {cache_key}, tier: {model_hint})")
+    return local_app, cache_key
+
 
-    # Agentに問い合わせをストリーミング
+def _open_stream(local_app: LocalApp, request: QueryRequest):
+    """
+    Agentへの問い合わせを開始し、イベントストリームを返すヘルパー関数。
+    モデル呼び出しの待ち行列が満杯の場合は503を返します。
+    """
     try:
-        logger.info(f"Agentに問い合わせ中 (session_id: {current_session_id})")
-        response_stream = await local_app.stream(
+        return local_app.stream(
             query=request.query,
-            session_id=current_session_id,
-            user_id=user_id
+            session_id=request.session_id,
+            user_id=request.user_id
         )
+    except AgentBusyError as e:
+        logger.warning(f"モデル呼び出しの待ち行列が上限に達しました: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
 
-        # ストリームから応答を連結して完全なレスポンスを作成
-        response_parts = []
-        async for event in response_stream:
-            response_parts.append(_parse_agent_event(event))
-
-        full_response = "".join(response_parts)
 
-        logger.info(f"Agentからの最終応答長: {len(full_response)}")
-        if not full_response:
+async def _agent_frames(response_stream, request: QueryRequest):
+    """
+    Agentの応答をSSE送信用のフレーム(dict)として逐次生成する共通ジェネレータ。
+    /query の直接ストリーミングと、バックグラウンドタスク実行の両方から利用されます。
+    """
+    try:
+        # イベントが届くたびにバッファへ直接書き込み、フレームとして逐次送信する
+        # （応答全体をリストに貯めて最後にjoinするとO(N^2)のアロケーションになる）
+        buf = io.StringIO()
+        total_chars = 0
+        preview = ""
+        async for event in response_stream:
+            _write_agent_event(event, buf)
+            delta = buf.getvalue()
+            if not delta:
+                continue
+            if not preview:
+                preview = delta[:200]
+            total_chars += len(delta)
+            yield {"delta": delta}
+            buf.truncate(0)
+            buf.seek(0)
+
+        # %s遅延フォーマット: DEBUGが無効な場合は文字列整形自体が走らない
+        logger.debug("Agentからの最終応答 (%d文字): %.200s", total_chars, preview)
+
+        # 終端フレーム（クライアントはこれを受け取ったら購読を終了する）
+        done_frame = {"session_id": request.session_id, "done": True}
+        if total_chars == 0:
             logger.warning("Agentからの応答が空でした。")
-            full_response = "すみません、応答を生成できませんでした。"
-        logger.info(f"Agentからの最終応答: {full_response}")
-
-        return QueryResponse(response=full_response, session_id=current_session_id)
+            yield {"delta": "すみません、応答を生成できませんでした。"}
+            # フォールバック文言を応答としてキャッシュさせないためのマーカー
+            done_frame["empty"] = True
+        yield done_frame
 
     except Exception as e:
+        # ストリーミング開始後はHTTPステータスを変更できないため、
+        # エラーもフレームとしてクライアントに通知する
         logger.error(f"Agentへの問い合わせ中にエラーが発生しました: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"内部サーバーエラー: {str(e)}")
-
-def _parse_agent_event(event: dict | object) -> str:
-    """Agentからのイベントをパースして、テキスト部分を抽出するヘルパー関数。"""
-    if (event.content and event.content.parts):
-        parts_text = []
-        for part in event.content.parts:
-            if part.text:
-                # partにtext属性があれば、それを追加
-                parts_text.append(part.text)
-            elif part.function_response:
-                # partにfunction_response属性があれば、その中の 'result' を文字列として追加
-                if (hasattr(part.function_response, 'response') and
-                    isinstance(part.function_response.response, dict) and
-                    'result' in part.function_response.response):                 
-                    function_name = part.function_response.name
-                    result_data = part.function_response.response['result']
-                    if isinstance(result_data, str):
-                        parts_text.append(f"{function_name}: {result_data}")
-        return "\n".join(parts_text)
-    else:
+        yield {"error": f"内部サーバーエラー: {str(e)}"}
+
+
+@app.post("/query", tags=["Agent"])
+async def query_agent(request: QueryRequest):
+    """
+    Agent Engineに問い合わせを行い、応答をSSE（Server-Sent Events）でストリーミングします。
+    応答全体をバッファせず、イベントが届くたびに逐次クライアントへ送信します。
+    """
+    await _ensure_vertex()
+    # 単純なターンは軽量モデルのティアへルーティングする
+    tier = select_model(request.query)
+    local_app, cache_key = await _local_app_for_session(request.session_id, model_hint=tier)
+
+    # 同一ツール構成・同一クエリの応答キャッシュを確認し、ヒットすればGeminiを呼ばずに再生する。
+    # 「はい」「続けて」のような短い相づち（cheapティア相当）は文脈依存が強く、
+    # 正規化すると無関係な会話同士で衝突するためキャッシュの対象にしない
+    use_cache = tier == "std"
+    response_key = None
+    if use_cache:
+        response_key = _response_cache_key(cache_key, request.query)
+        cached = await _get_cached_response(response_key)
+        if cached is not None:
+            logger.info(f"応答キャッシュにヒットしました (session_id: {request.session_id})")
+
+            async def replay_generator():
+                # キャッシュ済みの応答をチャンクに分けてSSEフレームとして再生する
+                for i in range(0, len(cached), 500):
+                    yield f"data: {json.dumps({'delta': cached[i:i + 500]}, ensure_ascii=False)}\n\n"
+                yield f"data: {json.dumps({'session_id': request.session_id, 'done': True})}\n\n"
+
+            return StreamingResponse(replay_generator(), media_type="text/event-stream")
+
+    response_stream = _open_stream(local_app, request)
+
+    # 同期ジェネレータだとStreamingResponseがスレッドプール実行になるため、
+    # 必ず非同期ジェネレータとして定義する
+    async def event_generator():
+        response_parts = []
+        async for frame in _agent_frames(response_stream, request):
+            delta = frame.get("delta")
+            if delta:
+                response_parts.append(delta)
+            if (use_cache and frame.get("done") and response_parts
+                    and not frame.get("empty")):
+                # 実応答つきでストリームが完走した場合のみキャッシュに保存する
+                # （エラー・空応答のフォールバック文言は保存しない）
+                await _store_cached_response(response_key, "".join(response_parts))
+            yield f"data: {json.dumps(frame, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+
+async def _run_query_task(response_stream, request: QueryRequest, queue: asyncio.Queue):
+    """バックグラウンドでAgentを実行し、フレームを結果キューへ書き込むタスク本体。"""
+    try:
+        async for frame in _agent_frames(response_stream, request):
+            await queue.put(frame)
+    finally:
+        # Noneを終端マーカーとして購読側に伝える
+        await queue.put(None)
+
+
+@app.post("/query/submit", status_code=202, response_model=SubmitQueryResponse, tags=["Agent"])
+async def submit_query(request: QueryRequest):
+    """
+    クエリをバックグラウンドタスクとして投入し、即座にtask_idを返します。
+    HTTPコネクションを長時間占有せず、結果は /query/stream/{task_id} から購読します。
+    """
+    await _ensure_vertex()
+    local_app, _ = await _local_app_for_session(
+        request.session_id, model_hint=select_model(request.query)
+    )
+    response_stream = _open_stream(local_app, request)
+
+    task_id = uuid.uuid4().hex
+    queue = asyncio.Queue()
+    app_state["query_tasks"][task_id] = queue
+    _spawn_background_task(_run_query_task(response_stream, request, queue))
+
+    logger.info(f"クエリをバックグラウンド実行に投入しました (task_id: {task_id})")
+    return SubmitQueryResponse(task_id=task_id)
+
+
+@app.get("/query/stream/{task_id}", tags=["Agent"])
+async def stream_query_result(task_id: str):
+    """バックグラウンド実行中のクエリの結果をSSEでストリーミングします。"""
+    queue = app_state["query_tasks"].get(task_id)
+    if queue is None:
+        raise HTTPException(status_code=404, detail=f"タスクが見つかりません: {task_id}")
+
+    async def event_generator():
+        while True:
+            frame = await queue.get()
+            if frame is None:
+                break
+            yield f"data: {json.dumps(frame, ensure_ascii=False)}\n\n"
+        app_state["query_tasks"].pop(task_id, None)
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+def _write_agent_event(event: dict | object, buf: io.StringIO) -> None:
+    """Agentからのイベントのテキスト部分を抽出し、バッファへ直接書き込むヘルパー関数。"""
+    content = event.content
+    if content is None or not content.parts:
         logger.warning("Agent からのメッセージが空でした")
-        return "Agent からのメッセージが空でした"
-    
+        return
+
+    wrote = False
+    for part in content.parts:
+        if part.text:
+            # partにテキストがあれば、中間リストを介さずバッファへ書き込む
+            if wrote:
+                buf.write("\n")
+            buf.write(part.text)
+            wrote = True
+        elif part.function_response is not None:
+            # function_responseがあれば、その中の 'result' を文字列として追加
+            response = part.function_response.response
+            if isinstance(response, dict) and 'result' in response:
+                result_data = response['result']
+                if isinstance(result_data, str):
+                    if wrote:
+                        buf.write("\n")
+                    buf.write(part.function_response.name)
+                    buf.write(": ")
+                    buf.write(result_data)
+                    wrote = True
+
+
 @app.get("/", include_in_schema=False)
-async def root():
-    return FileResponse('static/index.html')
+async def root(request: Request):
+    etag = app_state["index_etag"]
+    # ブラウザが既に同じ内容を持っていれば本文なしの304を返す
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(app_state["index_html"], media_type="text/html", headers={"ETag": etag})
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
@@ -0,0 +1,120 @@
+# redis_session_service.py
+import time
+import uuid
+from typing import Any, Optional
+
+import redis.asyncio as aioredis
+
+from google.adk.events import Event
+from google.adk.sessions import Session
+from google.adk.sessions.base_session_service import (
+    BaseSessionService,
+    GetSessionConfig,
+    ListSessionsResponse,
+)
+
+# セッションの有効期限（秒）。アクセスのたびに延長されます。
+SESSION_TTL_SECONDS = 3600
+
+
+class RedisSessionService(BaseSessionService):
+    """
+    セッションをRedisに永続化するSessionService。
+
+    InMemorySessionServiceと異なりセッションがプロセス外に保存されるため、
+    Cloud Runのように複数インスタンスへスケールアウトする構成でも
+    どのインスタンスからでも同じセッションを参照できます。
+    """
+
+    def __init__(self, client: aioredis.Redis, ttl: int = SESSION_TTL_SECONDS):
+        """
+        RedisSessionServiceを初期化します。
+
+        Args:
+            client: redis.asyncio.Redisのクライアント（decode_responses=True推奨）
+            ttl: セッションの有効期限（秒）
+        """
+        self._client = client
+        self._ttl = ttl
+
+    def _session_key(self, app_name: str, user_id: str, session_id: str) -> str:
+        return f"adk:session:{app_name}:{user_id}:{session_id}"
+
+    def _index_key(self, app_name: str, user_id: str) -> str:
+        return f"adk:sessions:{app_name}:{user_id}"
+
+    async def _save(self, session: Session) -> None:
+        """セッションをJSONとして保存し、TTLとユーザー別インデックスを更新します。"""
+        key = self._session_key(session.app_name, session.user_id, session.id)
+        index = self._index_key(session.app_name, session.user_id)
+        pipe = self._client.pipeline()
+        pipe.setex(key, self._ttl, session.model_dump_json())
+        pipe.sadd(index, session.id)
+        pipe.expire(index, self._ttl)
+        await pipe.execute()
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session = Session(
+            id=session_id or uuid.uuid4().hex,
+            app_name=app_name,
+            user_id=user_id,
+            state=state or {},
+            last_update_time=time.time(),
+        )
+        await self._save(session)
+        return session
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        raw = await self._client.get(self._session_key(app_name, user_id, session_id))
+        if raw is None:
+            return None
+        session = Session.model_validate_json(raw)
+        if config and config.num_recent_events:
+            session.events = session.events[-config.num_recent_events:]
+        return session
+
+    async def list_sessions(
+        self, *, app_name: str, user_id: str
+    ) -> ListSessionsResponse:
+        session_ids = await self._client.smembers(self._index_key(app_name, user_id))
+        sessions = []
+        for session_id in session_ids:
+            raw = await self._client.get(
+                self._session_key(app_name, user_id, session_id)
+            )
+            if raw is None:
+                continue
+            session = Session.model_validate_json(raw)
+            # 一覧ではイベント履歴は返さない（InMemorySessionServiceと同じ挙動）
+            session.events = []
+            sessions.append(session)
+        return ListSessionsResponse(sessions=sessions)
+
+    async def delete_session(
+        self, *, app_name: str, user_id: str, session_id: str
+    ) -> None:
+        pipe = self._client.pipeline()
+        pipe.delete(self._session_key(app_name, user_id, session_id))
+        pipe.srem(self._index_key(app_name, user_id), session_id)
+        await pipe.execute()
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        # 基底クラスがsessionのeventsとstateを更新するので、その結果を永続化する
+        event = await super().append_event(session, event)
+        session.last_update_time = time.time()
+        await self._save(session)
+        return event
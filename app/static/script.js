@@ -51,7 +51,8 @@ async function callCreateSession(selectedTools) {
     }
 }
 
-async function callQuery(query) {
+// SSEストリームを購読し、deltaが届くたびにonDeltaコールバックを呼ぶ
+async function callQuery(query, onDelta) {
     try {
         const response = await fetch(queryEndpoint, {
             method: 'POST',
@@ -68,8 +69,34 @@ async function callQuery(query) {
             throw new Error(`HTTP error! Status: ${response.status}`);
         }
 
-        const result = await response.json();
-        return result;
+        // POSTボディが必要なためEventSourceではなくfetchのReadableStreamで
+        // SSEフレーム（"data: ...\n\n"）をパースする
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let sepIndex;
+            while ((sepIndex = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, sepIndex);
+                buffer = buffer.slice(sepIndex + 2);
+                if (!frame.startsWith('data: ')) continue;
+
+                const payload = JSON.parse(frame.slice(6));
+                if (payload.error) {
+                    throw new Error(payload.error);
+                }
+                if (payload.done) {
+                    return;
+                }
+                if (payload.delta) {
+                    onDelta(payload.delta);
+                }
+            }
+        }
     } catch (e) {
         console.error(e.message);
     }
@@ -149,8 +176,12 @@ async function sendQuery() {
         } else {
             console.log(`現在のセッション: ${currentSessinId}`);
             console.log(`入力されたクエリ: ${query}`);
-            result = await callQuery(query);
-            document.getElementById('chat-content-tmp').textContent = result.response;
+            // 届いたdeltaを逐次描画する（全文を待たずにレンダリング）
+            const chatContent = document.getElementById('chat-content-tmp');
+            chatContent.textContent = '';
+            await callQuery(query, (delta) => {
+                chatContent.textContent += delta;
+            });
         }
     }
 }